@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -104,6 +105,75 @@ else:
     }
 
 
+# Rendered CSV segment cache for historical sales (see sales/report_cache.py)
+
+REPORT_SEGMENT_CACHE = {
+    'DIR': Path(os.getenv('REPORT_CACHE_DIR', BASE_DIR / 'report_cache')),
+    'BLOCK_SIZE': int(os.getenv('REPORT_CACHE_BLOCK_SIZE', '10000')),
+    'MAX_BYTES': int(os.getenv('REPORT_CACHE_MAX_BYTES', str(2 * 1024 ** 3))),
+}
+
+
+# Short-lived result cache for the analytics endpoints (seconds)
+
+ANALYTICS_CACHE_TTL = int(os.getenv('ANALYTICS_CACHE_TTL', '60'))
+
+
+# Largest ?preview=N accepted by the report endpoints
+
+REPORT_PREVIEW_MAX_ROWS = int(os.getenv('REPORT_PREVIEW_MAX_ROWS', '1000'))
+
+
+# Export admission control and per-export budgets (0 disables a budget)
+
+EXPORT_CONTROL = {
+    'MAX_CONCURRENT': int(os.getenv('EXPORT_MAX_CONCURRENT', '4')),
+    'QUEUE_TIMEOUT': float(os.getenv('EXPORT_QUEUE_TIMEOUT', '0')),
+    'RETRY_AFTER': int(os.getenv('EXPORT_RETRY_AFTER', '30')),
+    'MAX_ROWS': int(os.getenv('EXPORT_MAX_ROWS', '0')) or None,
+    'MAX_SECONDS': float(os.getenv('EXPORT_MAX_SECONDS', '0')) or None,
+    'LOCK_DIR': Path(os.getenv('EXPORT_LOCK_DIR', Path(tempfile.gettempdir()) / 'demo_orm_export_slots')),
+}
+
+
+# Export pipeline metrics, shared by all worker processes through one file
+
+METRICS = {
+    'STORE_PATH': Path(os.getenv('METRICS_STORE_PATH', Path(tempfile.gettempdir()) / 'demo_orm_metrics.json')),
+    'ALLOWED_IPS': [
+        address.strip()
+        for address in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+        if address.strip()
+    ],
+}
+
+
+# Query budgets (sales/query_budget.py): raise instead of logging when exceeded
+
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', '0').lower() in ('1', 'true', 'yes', 'on')
+
+
+# Read report money values from the integer-cents shadow columns (sales/money.py)
+
+SALES_MONEY_CENTS = os.getenv('SALES_MONEY_CENTS', '0').lower() in ('1', 'true', 'yes', 'on')
+
+
+# Optional sharding of Sale/SaleItem by reseller (see sales/sharding.py).
+# Reference tables (users, resellers, products, categories) are replicated
+# to every shard so reports can keep joining locally.
+
+SALES_SHARD_COUNT = int(os.getenv('SALES_SHARD_COUNT', '0'))
+SALES_SHARDS = [f'shard_{index}' for index in range(SALES_SHARD_COUNT)]
+
+for index, alias in enumerate(SALES_SHARDS):
+    if DB_ENGINE == 'mysql':
+        DATABASES[alias] = {**DATABASES['default'], 'NAME': f"{DATABASES['default']['NAME']}_shard_{index}"}
+    else:
+        DATABASES[alias] = {**DATABASES['default'], 'NAME': BASE_DIR / f'db_shard_{index}.sqlite3'}
+
+DATABASE_ROUTERS = ['sales.sharding.SalesShardRouter']
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
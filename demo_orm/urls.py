@@ -17,7 +17,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 
+from sales.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('sales/', include('sales.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
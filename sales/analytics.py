@@ -0,0 +1,110 @@
+from itertools import chain, groupby
+from operator import itemgetter
+
+from django.db.models import Count, DateField, F, Sum, Window
+from django.db.models.functions import Rank, TruncMonth
+
+from .filters import apply_report_filters
+from .models import SaleItem
+from .sharding import sale_aliases
+
+
+def _merge_sums(rows, key, fields):
+    merged = {}
+    for row in rows:
+        current = merged.get(key(row))
+        if current is None:
+            merged[key(row)] = dict(row)
+            continue
+        for field in fields:
+            current[field] += row[field]
+    return list(merged.values())
+
+
+def top_products(filters, limit):
+    queryset = (
+        apply_report_filters(SaleItem.objects.all(), filters)
+        .values('product_id')
+        .annotate(
+            sku=F('product__sku'),
+            name=F('product__name'),
+            quantity=Sum('quantity'),
+            revenue=Sum('line_total'),
+        )
+        .order_by('-revenue', 'product_id')
+    )
+    aliases = sale_aliases(filters.get('reseller'))
+    if len(aliases) == 1:
+        return list(queryset.using(aliases[0])[:limit])
+
+    rows = _merge_sums(
+        chain.from_iterable(queryset.using(alias) for alias in aliases),
+        itemgetter('product_id'),
+        ('quantity', 'revenue'),
+    )
+    rows.sort(key=lambda row: (-row['revenue'], row['product_id']))
+    return rows[:limit]
+
+
+def _rank_by_region(rows, limit):
+    ranked = []
+    rows = sorted(rows, key=lambda row: (row['region'], -row['revenue'], row['reseller_id']))
+    for _, region_rows in groupby(rows, key=itemgetter('region')):
+        previous = None
+        for position, row in enumerate(region_rows, start=1):
+            if previous is None or row['revenue'] != previous['revenue']:
+                rank = position
+            if rank > limit:
+                break
+            ranked.append({**row, 'rank': rank})
+            previous = row
+    return ranked
+
+
+def top_resellers_by_region(filters, limit):
+    # Each reseller lives on a single shard, so a shard's top `limit` per region
+    # always contains every reseller of the global top `limit`.
+    queryset = (
+        apply_report_filters(SaleItem.objects.all(), filters)
+        .values('sale__reseller_id')
+        .annotate(
+            reseller_id=F('sale__reseller_id'),
+            region=F('sale__reseller__region'),
+            company_name=F('sale__reseller__company_name'),
+            sale_count=Count('sale_id', distinct=True),
+            revenue=Sum('line_total'),
+        )
+        .annotate(rank=Window(Rank(), partition_by=F('region'), order_by=F('revenue').desc()))
+        .filter(rank__lte=limit)
+        .order_by('region', 'rank', 'reseller_id')
+    )
+    aliases = sale_aliases(filters.get('reseller'))
+    if len(aliases) == 1:
+        return list(queryset.using(aliases[0]))
+
+    return _rank_by_region(chain.from_iterable(queryset.using(alias) for alias in aliases), limit)
+
+
+def category_mix_by_month(filters):
+    queryset = (
+        apply_report_filters(SaleItem.objects.all(), filters)
+        .annotate(month=TruncMonth('sale__sold_at', output_field=DateField()))
+        .values('month', 'category_id')
+        .annotate(
+            category=F('category__name'),
+            quantity=Sum('quantity'),
+            revenue=Sum('line_total'),
+        )
+        .order_by('month', '-revenue', 'category_id')
+    )
+    aliases = sale_aliases(filters.get('reseller'))
+    if len(aliases) == 1:
+        return list(queryset.using(aliases[0]))
+
+    rows = _merge_sums(
+        chain.from_iterable(queryset.using(alias) for alias in aliases),
+        itemgetter('month', 'category_id'),
+        ('quantity', 'revenue'),
+    )
+    rows.sort(key=lambda row: (row['month'], -row['revenue'], row['category_id']))
+    return rows
@@ -0,0 +1,144 @@
+import fcntl
+import logging
+import time
+from functools import wraps
+from pathlib import Path
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException, Throttled
+
+from .metrics import ExportTracker
+
+logger = logging.getLogger(__name__)
+
+QUEUE_POLL_INTERVAL = 0.1
+
+
+class ExportBudgetExceeded(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'Export exceeded its budget.'
+    default_code = 'export_budget_exceeded'
+
+
+class ExportBudget:
+    def __init__(self, tracker, max_rows=None, max_seconds=None):
+        self._tracker = tracker
+        self._max_rows = max_rows
+        self._max_seconds = max_seconds
+        self._started_at = time.monotonic()
+
+    def count_rows(self, rows):
+        self._tracker.count_rows(rows)
+        self.check()
+
+    def check(self):
+        if self._max_rows is not None and self._tracker.rows > self._max_rows:
+            self._abort(f'Export exceeded the row budget of {self._max_rows} rows.')
+        if self._max_seconds is not None and time.monotonic() - self._started_at > self._max_seconds:
+            self._abort(f'Export exceeded the time budget of {self._max_seconds} seconds.')
+
+    def _abort(self, message):
+        self._tracker.finish('budget_exceeded')
+        logger.warning(message)
+        raise ExportBudgetExceeded(message)
+
+
+class ExportSlot:
+    def __init__(self, handle):
+        self._handle = handle
+
+    def release(self):
+        if self._handle is None:
+            return
+        fcntl.flock(self._handle, fcntl.LOCK_UN)
+        self._handle.close()
+        self._handle = None
+
+
+def _try_acquire_slot(lock_dir, max_concurrent):
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    for index in range(max_concurrent):
+        handle = open(lock_dir / f'export-slot-{index}.lock', 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            continue
+        return ExportSlot(handle)
+    return None
+
+
+def acquire_export_slot():
+    config = settings.EXPORT_CONTROL
+    lock_dir = Path(config['LOCK_DIR'])
+    deadline = time.monotonic() + config['QUEUE_TIMEOUT']
+    while True:
+        slot = _try_acquire_slot(lock_dir, config['MAX_CONCURRENT'])
+        if slot is not None or time.monotonic() >= deadline:
+            return slot
+        time.sleep(QUEUE_POLL_INTERVAL)
+
+
+class ExportStream:
+    def __init__(self, content, slot, tracker, budget):
+        self._content = iter(content)
+        self._slot = slot
+        self._tracker = tracker
+        self._budget = budget
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            chunk = next(self._content)
+        except StopIteration:
+            self._tracker.finish('completed')
+            self.close()
+            raise
+        self._tracker.chunk_sent(chunk)
+        try:
+            self._budget.check()
+        except ExportBudgetExceeded:
+            self.close()
+            raise
+        return chunk
+
+    def close(self):
+        self._tracker.finish('aborted')
+        self._slot.release()
+
+
+def export_admission(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        config = settings.EXPORT_CONTROL
+        slot = acquire_export_slot()
+        if slot is None:
+            logger.warning('Rejected export %s: %s exports already running.', request.path, config['MAX_CONCURRENT'])
+            raise Throttled(wait=config['RETRY_AFTER'], detail='Too many exports running. Try again later.')
+
+        tracker = ExportTracker(view.__name__)
+        budget = ExportBudget(tracker, max_rows=config['MAX_ROWS'], max_seconds=config['MAX_SECONDS'])
+        request.export_tracker = tracker
+        request.export_budget = budget
+        try:
+            response = view(request, *args, **kwargs)
+            if not response.streaming:
+                budget.check()
+        except BaseException:
+            tracker.finish('failed')
+            slot.release()
+            raise
+
+        if not response.streaming:
+            tracker.chunk_sent(response.content)
+            tracker.finish('completed')
+            slot.release()
+            return response
+
+        response.streaming_content = ExportStream(response.streaming_content, slot, tracker, budget)
+        return response
+
+    return wrapper
@@ -0,0 +1,16 @@
+REPORT_FILTER_LOOKUPS = {
+    'sold_from': 'sale__sold_at__gte',
+    'sold_to': 'sale__sold_at__lt',
+    'reseller': 'sale__reseller_id',
+    'region': 'sale__reseller__region',
+    'category': 'category_id',
+}
+
+
+def apply_report_filters(item_queryset, filters):
+    lookups = {
+        REPORT_FILTER_LOOKUPS[name]: value
+        for name, value in filters.items()
+        if name in REPORT_FILTER_LOOKUPS
+    }
+    return item_queryset.filter(**lookups) if lookups else item_queryset
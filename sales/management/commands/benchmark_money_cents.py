@@ -0,0 +1,97 @@
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from sales.report_cache import get_segment_cache
+
+MODES = (('decimal', False), ('cents', True))
+
+
+class Command(BaseCommand):
+    help = 'Compare seed and export throughput with Decimal and integer-cents money columns in a test database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sale-count', type=int, default=20000)
+        parser.add_argument('--repeat', type=int, default=4)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        old_names = {}
+        try:
+            for alias in connections:
+                old_names[alias] = connections[alias].settings_dict['NAME']
+                connections[alias].creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            with tempfile.TemporaryDirectory() as scratch:
+                results = self._run(Path(scratch), options['sale_count'], options['repeat'], options['seed'])
+        finally:
+            for alias, old_name in old_names.items():
+                connections[alias].creation.destroy_test_db(old_name, verbosity=0)
+            get_segment_cache.cache_clear()
+
+        self._report(results)
+
+    def _run(self, scratch, sale_count, repeat, seed):
+        overrides = {
+            'REPORT_SEGMENT_CACHE': {**settings.REPORT_SEGMENT_CACHE, 'DIR': scratch / 'report_cache'},
+            'METRICS': {**settings.METRICS, 'STORE_PATH': scratch / 'metrics.json'},
+        }
+        seed_timings = {label: [] for label, _ in MODES}
+        with override_settings(**overrides):
+            get_segment_cache.cache_clear()
+            for attempt in range(repeat):
+                for label, money_cents in MODES if attempt % 2 == 0 else MODES[::-1]:
+                    with override_settings(SALES_MONEY_CENTS=money_cents):
+                        seed_timings[label].append(self._seed(sale_count, seed))
+            results = {label: {'seed_seconds': min(timings)} for label, timings in seed_timings.items()}
+
+            outputs = {}
+            for attempt in range(repeat):
+                for label, money_cents in MODES if attempt % 2 == 0 else MODES[::-1]:
+                    with override_settings(SALES_MONEY_CENTS=money_cents):
+                        seconds, outputs[label] = self._export()
+                    results[label]['export_seconds'] = min(results[label].get('export_seconds', seconds), seconds)
+                    results[label]['rows'] = outputs[label].count(b'\n') - 1
+
+        if outputs['decimal'] != outputs['cents']:
+            raise CommandError('The integer-cents export does not match the Decimal export.')
+        results['sale_count'] = sale_count
+        return results
+
+    def _seed(self, sale_count, seed):
+        call_command('seed_sales', reset=True, sale_count=0, seed=seed, stdout=StringIO())
+        started = time.perf_counter()
+        call_command('seed_sales', sale_count=sale_count, seed=seed, stdout=StringIO())
+        return time.perf_counter() - started
+
+    def _export(self):
+        started = time.perf_counter()
+        response = Client().get(reverse('report-optimized-csv'))
+        content = b''.join(response.streaming_content)
+        response.close()
+        if response.status_code != 200:
+            raise CommandError(f'Export failed with HTTP {response.status_code}.')
+        return time.perf_counter() - started, content
+
+    def _report(self, results):
+        decimal, cents = results['decimal'], results['cents']
+        sale_count = results['sale_count']
+        self.stdout.write(f'{"money":<8} {"seed s":>8} {"sales/s":>10} {"export s":>9} {"rows/s":>10}')
+        for label in ('decimal', 'cents'):
+            result = results[label]
+            self.stdout.write(
+                f'{label:<8} {result["seed_seconds"]:>8.2f} {sale_count / result["seed_seconds"]:>10.0f} '
+                f'{result["export_seconds"]:>9.2f} {result["rows"] / result["export_seconds"]:>10.0f}'
+            )
+        self.stdout.write(
+            f'Speedup: seed {decimal["seed_seconds"] / cents["seed_seconds"]:.2f}x, '
+            f'export {decimal["export_seconds"] / cents["export_seconds"]:.2f}x. CSV output is identical.'
+        )
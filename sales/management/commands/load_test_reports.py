@@ -0,0 +1,254 @@
+import http.client
+import logging
+import statistics
+import threading
+import time
+import weakref
+from datetime import timedelta
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, get_internal_wsgi_application
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test.testcases import QuietWSGIRequestHandler
+from django.urls import reverse
+from django.utils import timezone
+
+from sales.models import Reseller
+
+ENDPOINTS = {
+    'unoptimized': ('report-unoptimized-csv', False),
+    'optimized': ('report-optimized-csv', True),
+    'optimized-categories': ('report-optimized-categories-csv', True),
+    'cached': ('report-cached-csv', True),
+}
+READ_SIZE = 64 * 1024
+SAMPLE_INTERVAL = 0.05
+QUIET_LOGGERS = ('django.request', 'sales')
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
+
+
+class _InProcessServer:
+    def __init__(self):
+        self.server = ThreadedWSGIServer(('127.0.0.1', 0), QuietWSGIRequestHandler, allow_reuse_address=False)
+        self.server.set_app(get_internal_wsgi_application())
+        self.thread = threading.Thread(target=self.server.serve_forever, name='load-test-server', daemon=True)
+        self.log_levels = {}
+
+    @property
+    def address(self):
+        return self.server.server_address[:2]
+
+    def __enter__(self):
+        for name in QUIET_LOGGERS:
+            logger = logging.getLogger(name)
+            self.log_levels[name] = logger.level
+            logger.setLevel(logging.ERROR)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        for name, level in self.log_levels.items():
+            logging.getLogger(name).setLevel(level)
+
+
+class _ConnectionSampler:
+    def __init__(self, in_process):
+        self.in_process = in_process
+        self.enabled = in_process or connection.vendor == 'mysql'
+        self.opened = 0
+        self.samples = []
+        self._wrappers = weakref.WeakSet()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _connection_created(self, sender, connection, **kwargs):
+        self.opened += 1
+        self._wrappers.add(connection)
+
+    def _open_connections(self):
+        if self.in_process:
+            return sum(1 for wrapper in list(self._wrappers) if wrapper.connection is not None)
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW STATUS LIKE 'Threads_connected'")
+            return int(cursor.fetchone()[1]) - 1
+
+    def _run(self):
+        try:
+            while not self._stop.wait(SAMPLE_INTERVAL):
+                self.samples.append(self._open_connections())
+        finally:
+            if not self.in_process:
+                connection.close()
+
+    def __enter__(self):
+        if self.in_process:
+            connection_created.connect(self._connection_created)
+        if self.enabled:
+            self._thread = threading.Thread(target=self._run, name='load-test-db-sampler', daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        connection_created.disconnect(self._connection_created)
+
+
+class Command(BaseCommand):
+    help = 'Run concurrent clients against the report endpoints and report latency, throughput and DB connection use.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of a running server. Defaults to an in-process threaded server.')
+        parser.add_argument('--concurrency', default='1,2,4,8')
+        parser.add_argument('--requests-per-client', type=int, default=4)
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+        parser.add_argument('--no-filters', action='store_true', help='Only request the unfiltered reports.')
+        parser.add_argument('--timeout', type=float, default=300)
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError('--concurrency must be a comma-separated list of integers')
+        endpoints = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f'Unknown endpoints: {", ".join(sorted(unknown))}')
+
+        targets = self._targets(endpoints, with_filters=not options['no_filters'])
+        connections.close_all()
+
+        self.stdout.write(f'{len(targets)} request variants:')
+        for label, _ in targets:
+            self.stdout.write(f'  {label}')
+
+        if options['url']:
+            parts = urlsplit(options['url'])
+            address = (parts.hostname, parts.port or 80)
+            if connection.vendor != 'mysql':
+                self.stdout.write(self.style.WARNING('DB connection use is only sampled in-process or on MySQL.'))
+            self._run_levels(address, parts.path.rstrip('/'), targets, levels, options, in_process=False)
+            return
+
+        with _InProcessServer() as server:
+            self._run_levels(server.address, '', targets, levels, options, in_process=True)
+
+    def _targets(self, endpoints, with_filters):
+        reseller = Reseller.objects.order_by('id').values('id', 'region').first()
+        variants = [('', {})]
+        if with_filters:
+            variants.append(('preview', {'preview': 100}))
+            sold_from = (timezone.now() - timedelta(days=30)).replace(microsecond=0).isoformat()
+            variants.append(('last-30-days', {'sold_from': sold_from}))
+            if reseller is not None:
+                variants.append(('reseller', {'reseller': reseller['id']}))
+                variants.append(('region', {'region': reseller['region']}))
+
+        targets = []
+        for name in endpoints:
+            url_name, filterable = ENDPOINTS[name]
+            for variant, params in variants if filterable else variants[:1]:
+                path = reverse(url_name)
+                if params:
+                    path = f'{path}?{urlencode(params)}'
+                targets.append((f'{name} {variant}'.strip(), path))
+        return targets
+
+    def _run_levels(self, address, prefix, targets, levels, options, in_process):
+        self.stdout.write(
+            f'{"clients":>7} {"reqs":>5} {"err%":>6} {"429":>4} '
+            f'{"p50 s":>7} {"p95 s":>7} {"p99 s":>7} {"ttfb50":>7} {"ttfb95":>7} '
+            f'{"req/s":>7} {"MB/s":>7} {"db max":>6} {"db avg":>6} {"db new":>6}'
+        )
+        for level in levels:
+            with _ConnectionSampler(in_process) as sampler:
+                results, wall = self._run_level(address, prefix, targets, level, options)
+            self._report_level(level, results, wall, sampler)
+
+    def _run_level(self, address, prefix, targets, clients, options):
+        results = []
+        lock = threading.Lock()
+
+        def client(index):
+            for number in range(options['requests_per_client']):
+                _, path = targets[(index + number * clients) % len(targets)]
+                result = self._fetch(address, prefix + path, options['timeout'])
+                with lock:
+                    results.append(result)
+
+        threads = [
+            threading.Thread(target=client, args=(index,), name=f'load-test-client-{index}')
+            for index in range(clients)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.perf_counter() - started
+
+    def _fetch(self, address, path, timeout):
+        started = time.perf_counter()
+        client = http.client.HTTPConnection(*address, timeout=timeout)
+        try:
+            client.request('GET', path)
+            response = client.getresponse()
+            chunk = response.read1(READ_SIZE)
+            first_byte = time.perf_counter() - started
+            size = 0
+            while chunk:
+                size += len(chunk)
+                chunk = response.read1(READ_SIZE)
+            status = response.status
+        except (OSError, http.client.HTTPException) as error:
+            return {'status': None, 'error': str(error), 'seconds': time.perf_counter() - started}
+        finally:
+            client.close()
+        return {
+            'status': status,
+            'error': None if status == 200 else f'HTTP {status}',
+            'seconds': time.perf_counter() - started,
+            'ttfb': first_byte,
+            'bytes': size,
+        }
+
+    def _report_level(self, level, results, wall, sampler):
+        succeeded = [result for result in results if result['error'] is None]
+        latencies = sorted(result['seconds'] for result in succeeded)
+        first_bytes = sorted(result['ttfb'] for result in succeeded)
+        rejected = sum(1 for result in results if result['status'] == 429)
+        error_rate = 100 * (len(results) - len(succeeded)) / len(results) if results else 0
+        megabytes = sum(result['bytes'] for result in succeeded) / 1024 ** 2
+
+        def seconds(value):
+            return '-' if value is None else f'{value:.3f}'
+
+        if sampler.samples:
+            db_max = str(max(sampler.samples))
+            db_avg = f'{statistics.fmean(sampler.samples):.1f}'
+        else:
+            db_max = db_avg = '-'
+        db_new = str(sampler.opened) if sampler.in_process else '-'
+
+        self.stdout.write(
+            f'{level:>7} {len(results):>5} {error_rate:>6.1f} {rejected:>4} '
+            f'{seconds(_percentile(latencies, 50)):>7} {seconds(_percentile(latencies, 95)):>7} '
+            f'{seconds(_percentile(latencies, 99)):>7} {seconds(_percentile(first_bytes, 50)):>7} '
+            f'{seconds(_percentile(first_bytes, 95)):>7} {len(results) / wall:>7.2f} {megabytes / wall:>7.2f} '
+            f'{db_max:>6} {db_avg:>6} {db_new:>6}'
+        )
+        for error in sorted({result['error'] for result in results if result['error'] and result['status'] != 429}):
+            self.stdout.write(self.style.WARNING(f'  {error}'))
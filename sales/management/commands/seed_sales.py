@@ -1,13 +1,19 @@
 import random
 from datetime import timedelta
 from decimal import Decimal, ROUND_HALF_UP
+from functools import partial
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand
-from django.db import transaction
+from django.db import DEFAULT_DB_ALIAS, transaction
 from django.utils import timezone
 
 from sales.models import Category, Product, Reseller, Sale, SaleItem
+from sales.money import from_cents, to_cents
+from sales.query_budget import query_budget
+from sales.report_cache import get_segment_cache
+from sales.sharding import allocate_sale_ids, sale_aliases, shard_for_reseller, sharding_enabled
 
 
 class Command(BaseCommand):
@@ -50,16 +56,27 @@ class Command(BaseCommand):
         products = self._create_products(product_count, chunk_size)
         product_category_map = self._link_products_to_categories(products, categories, chunk_size)
 
-        self._create_sales_and_items(
-            resellers=resellers,
-            products=products,
-            categories=categories,
-            product_category_map=product_category_map,
-            sale_count=sale_count,
-            min_items_per_sale=min_items_per_sale,
-            max_items_per_sale=max_items_per_sale,
+        if sharding_enabled():
+            self._replicate_reference_data(chunk_size)
+
+        sales_budget = query_budget(
+            max_queries=1,
+            per_chunk_queries=(4 + max_items_per_sale) * len(sale_aliases()),
             chunk_size=chunk_size,
+            name='seed_sales',
         )
+        with sales_budget:
+            self._create_sales_and_items(
+                resellers=resellers,
+                products=products,
+                categories=categories,
+                product_category_map=product_category_map,
+                sale_count=sale_count,
+                min_items_per_sale=min_items_per_sale,
+                max_items_per_sale=max_items_per_sale,
+                chunk_size=chunk_size,
+                budget=sales_budget,
+            )
 
         self.stdout.write(self.style.SUCCESS('Seed process finished successfully.'))
 
@@ -67,14 +84,18 @@ class Command(BaseCommand):
         self.stdout.write(self.style.WARNING('Reset flag enabled. Clearing existing data...'))
         User = get_user_model()
 
-        with transaction.atomic():
-            SaleItem.objects.all().delete()
-            Sale.objects.all().delete()
-            Product.categories.through.objects.all().delete()
-            Product.objects.all().delete()
-            Category.objects.all().delete()
-            Reseller.objects.all().delete()
-            User.objects.filter(username__startswith='seed_user_').delete()
+        # Shards first: deleting reference rows on default also deletes their shard copies.
+        for alias in dict.fromkeys([*sale_aliases(), DEFAULT_DB_ALIAS]):
+            with transaction.atomic(using=alias):
+                SaleItem.objects.using(alias).all().delete()
+                Sale.objects.using(alias).all().delete()
+                Product.categories.through.objects.using(alias).all().delete()
+                Product.objects.using(alias).all().delete()
+                Category.objects.using(alias).all().delete()
+                Reseller.objects.using(alias).all().delete()
+                User.objects.using(alias).filter(username__startswith='seed_user_').delete()
+
+        get_segment_cache().clear()
 
     def _create_users(self, user_count, chunk_size):
         User = get_user_model()
@@ -157,6 +178,7 @@ class Command(BaseCommand):
                     name=f'Product {index:06d}',
                     description=f'Description for product {index:06d}',
                     base_price=base_price,
+                    base_price_cents=to_cents(base_price),
                     stock_quantity=random.randint(5, 1000),
                 )
             )
@@ -205,8 +227,9 @@ class Command(BaseCommand):
         min_items_per_sale,
         max_items_per_sale,
         chunk_size,
+        budget,
     ):
-        existing_sales = Sale.objects.count()
+        existing_sales = sum(Sale.objects.using(alias).count() for alias in sale_aliases())
         if existing_sales >= sale_count:
             self.stdout.write(self.style.NOTICE('Sales already present. Skipping sale/item generation.'))
             return
@@ -214,7 +237,20 @@ class Command(BaseCommand):
         self.stdout.write(f'Creating sales: {sale_count}')
         reseller_ids = [reseller.id for reseller in resellers]
         category_ids = [category.id for category in categories]
-        product_payload = [(product.id, product.base_price) for product in products]
+        if settings.SALES_MONEY_CENTS:
+            product_payload = [(product.id, product.base_price_cents) for product in products]
+            build_items = self._build_sale_items_cents
+        else:
+            product_payload = [(product.id, product.base_price) for product in products]
+            build_items = self._build_sale_items
+        build_items = partial(
+            build_items,
+            product_payload=product_payload,
+            product_category_map=product_category_map,
+            category_ids=category_ids,
+            min_items_per_sale=min_items_per_sale,
+            max_items_per_sale=max_items_per_sale,
+        )
 
         now = timezone.now()
         total_created = 0
@@ -231,6 +267,13 @@ class Command(BaseCommand):
                     )
                 )
 
+            if sharding_enabled():
+                self._insert_sharded_chunk(sale_batch, build_items, chunk_size)
+                total_created += current_chunk
+                budget.count_rows(current_chunk)
+                self.stdout.write(f'  Progress: {total_created}/{sale_count} sales created')
+                continue
+
             with transaction.atomic():
                 previous_max_sale_id = (
                     Sale.objects.order_by('-id').values_list('id', flat=True).first() or 0
@@ -250,33 +293,117 @@ class Command(BaseCommand):
                         'Abort to avoid creating orphan sale items.'
                     )
 
-                item_batch = []
-                for sale_id in created_sale_ids:
-                    item_count = random.randint(min_items_per_sale, max_items_per_sale)
-                    for _ in range(item_count):
-                        product_id, base_price = random.choice(product_payload)
-                        candidate_categories = product_category_map.get(product_id) or category_ids
-                        selected_category = random.choice(candidate_categories)
-
-                        quantity = random.randint(1, 8)
-                        multiplier = Decimal(str(random.uniform(0.85, 1.20))).quantize(
-                            Decimal('0.0001'), rounding=ROUND_HALF_UP
-                        )
-                        unit_price = (base_price * multiplier).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-                        line_total = (unit_price * quantity).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-
-                        item_batch.append(
-                            SaleItem(
-                                sale_id=sale_id,
-                                product_id=product_id,
-                                category_id=selected_category,
-                                quantity=quantity,
-                                unit_price=unit_price,
-                                line_total=line_total,
-                            )
-                        )
-
+                item_batch = build_items(created_sale_ids)
                 SaleItem.objects.bulk_create(item_batch, batch_size=chunk_size)
 
             total_created += current_chunk
+            budget.count_rows(current_chunk)
             self.stdout.write(f'  Progress: {total_created}/{sale_count} sales created')
+
+    def _insert_sharded_chunk(self, sale_batch, build_items, chunk_size):
+        sales_by_shard = {}
+        for sale in sale_batch:
+            sales_by_shard.setdefault(shard_for_reseller(sale.reseller_id), []).append(sale)
+
+        for alias, shard_sales in sales_by_shard.items():
+            with transaction.atomic(using=alias):
+                for sale, sale_id in zip(shard_sales, allocate_sale_ids(alias, len(shard_sales))):
+                    sale.id = sale_id
+                Sale.objects.using(alias).bulk_create(shard_sales, batch_size=chunk_size)
+                item_batch = build_items([sale.id for sale in shard_sales])
+                SaleItem.objects.using(alias).bulk_create(item_batch, batch_size=chunk_size)
+
+    def _build_sale_items(
+        self,
+        sale_ids,
+        *,
+        product_payload,
+        product_category_map,
+        category_ids,
+        min_items_per_sale,
+        max_items_per_sale,
+    ):
+        item_batch = []
+        for sale_id in sale_ids:
+            item_count = random.randint(min_items_per_sale, max_items_per_sale)
+            for _ in range(item_count):
+                product_id, base_price = random.choice(product_payload)
+                candidate_categories = product_category_map.get(product_id) or category_ids
+                selected_category = random.choice(candidate_categories)
+
+                quantity = random.randint(1, 8)
+                multiplier = Decimal(str(random.uniform(0.85, 1.20))).quantize(
+                    Decimal('0.0001'), rounding=ROUND_HALF_UP
+                )
+                unit_price = (base_price * multiplier).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+                line_total = (unit_price * quantity).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+                item_batch.append(
+                    SaleItem(
+                        sale_id=sale_id,
+                        product_id=product_id,
+                        category_id=selected_category,
+                        quantity=quantity,
+                        unit_price=unit_price,
+                        line_total=line_total,
+                        unit_price_cents=to_cents(unit_price),
+                        line_total_cents=to_cents(line_total),
+                    )
+                )
+        return item_batch
+
+    def _build_sale_items_cents(
+        self,
+        sale_ids,
+        *,
+        product_payload,
+        product_category_map,
+        category_ids,
+        min_items_per_sale,
+        max_items_per_sale,
+    ):
+        item_batch = []
+        for sale_id in sale_ids:
+            item_count = random.randint(min_items_per_sale, max_items_per_sale)
+            for _ in range(item_count):
+                product_id, base_price_cents = random.choice(product_payload)
+                candidate_categories = product_category_map.get(product_id) or category_ids
+                selected_category = random.choice(candidate_categories)
+
+                quantity = random.randint(1, 8)
+                multiplier = round(random.uniform(0.85, 1.20) * 10000)
+                unit_price_cents = (base_price_cents * multiplier + 5000) // 10000
+                line_total_cents = unit_price_cents * quantity
+
+                item_batch.append(
+                    SaleItem(
+                        sale_id=sale_id,
+                        product_id=product_id,
+                        category_id=selected_category,
+                        quantity=quantity,
+                        unit_price=from_cents(unit_price_cents),
+                        line_total=from_cents(line_total_cents),
+                        unit_price_cents=unit_price_cents,
+                        line_total_cents=line_total_cents,
+                    )
+                )
+        return item_batch
+
+    def _replicate_reference_data(self, chunk_size):
+        User = get_user_model()
+        reference_querysets = [
+            User.objects.filter(reseller_profile__isnull=False),
+            Reseller.objects.all(),
+            Category.objects.all(),
+            Product.objects.all(),
+            Product.categories.through.objects.all(),
+        ]
+
+        for alias in settings.SALES_SHARDS:
+            self.stdout.write(f'Replicating reference data to {alias}...')
+            for queryset in reference_querysets:
+                rows = list(queryset.order_by('pk'))
+                for start in range(0, len(rows), chunk_size):
+                    queryset.model.objects.using(alias).bulk_create(
+                        rows[start:start + chunk_size], ignore_conflicts=True
+                    )
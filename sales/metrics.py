@@ -0,0 +1,259 @@
+import bisect
+import fcntl
+import json
+import os
+import resource
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+BATCH_SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+ROWS_PER_SECOND_BUCKETS = (1e3, 5e3, 1e4, 2.5e4, 5e4, 1e5, 2.5e5, 5e5, 1e6)
+BYTES_PER_SECOND_BUCKETS = (1e5, 1e6, 5e6, 1e7, 2.5e7, 5e7, 1e8, 2.5e8, 5e8, 1e9)
+MEMORY_BUCKETS = tuple(2 ** power for power in range(25, 33))
+
+HISTOGRAMS = {
+    'sales_export_duration_seconds': ('Wall time of an export.', SECONDS_BUCKETS),
+    'sales_export_time_to_first_byte_seconds': ('Time until the first chunk was produced.', SECONDS_BUCKETS),
+    'sales_export_rows_per_second': ('Rows streamed per second, per export.', ROWS_PER_SECOND_BUCKETS),
+    'sales_export_bytes_per_second': ('Bytes streamed per second, per export.', BYTES_PER_SECOND_BUCKETS),
+    'sales_export_batch_fetch_seconds': ('Time spent fetching a batch of rows from the database.', BATCH_SECONDS_BUCKETS),
+    'sales_export_batch_encode_seconds': ('Time spent encoding a batch of rows to CSV.', BATCH_SECONDS_BUCKETS),
+    'sales_export_peak_memory_bytes': ('Peak resident memory of the worker during an export.', MEMORY_BUCKETS),
+}
+
+COUNTERS = {
+    'sales_exports_total': 'Exports finished, by outcome.',
+    'sales_export_rows_total': 'Rows streamed by exports.',
+    'sales_export_bytes_total': 'Bytes streamed by exports.',
+}
+
+ACTIVE_GAUGE = 'sales_exports_active'
+
+BATCH_SIZE = 5000
+
+
+def _current_rss_bytes():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsStore:
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def _update(self, apply):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a+') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            handle.seek(0)
+            content = handle.read()
+            data = json.loads(content) if content else {}
+            apply(data)
+            handle.seek(0)
+            handle.truncate()
+            json.dump(data, handle, separators=(',', ':'))
+
+    def read(self):
+        try:
+            with open(self.path) as handle:
+                fcntl.flock(handle, fcntl.LOCK_SH)
+                content = handle.read()
+        except FileNotFoundError:
+            return {}
+        return json.loads(content) if content else {}
+
+    def export_started(self, endpoint):
+        pid = str(os.getpid())
+
+        def apply(data):
+            active = data.setdefault('active', {}).setdefault(endpoint, {})
+            active[pid] = active.get(pid, 0) + 1
+
+        self._update(apply)
+
+    def export_finished(self, endpoint, counters, observations):
+        pid = str(os.getpid())
+
+        def apply(data):
+            active = data.setdefault('active', {}).setdefault(endpoint, {})
+            active[pid] = max(active.get(pid, 0) - 1, 0)
+            if not active[pid]:
+                del active[pid]
+
+            for name, labels, value in counters:
+                key = _series_key(name, labels)
+                series = data.setdefault('counters', {})
+                series[key] = series.get(key, 0) + value
+
+            for name, values in observations.items():
+                if not values:
+                    continue
+                buckets = HISTOGRAMS[name][1]
+                key = _series_key(name, {'endpoint': endpoint})
+                histogram = data.setdefault('histograms', {}).setdefault(
+                    key, {'buckets': [0] * (len(buckets) + 1), 'sum': 0, 'count': 0}
+                )
+                for value in values:
+                    histogram['buckets'][bisect.bisect_left(buckets, value)] += 1
+                    histogram['sum'] += value
+                    histogram['count'] += 1
+
+        self._update(apply)
+
+
+def _series_key(name, labels):
+    return json.dumps([name, sorted(labels.items())])
+
+
+def get_metrics_store():
+    return MetricsStore(settings.METRICS['STORE_PATH'])
+
+
+class ExportTracker:
+    def __init__(self, endpoint, store=None):
+        self.endpoint = endpoint
+        self.store = store or get_metrics_store()
+        self.started_at = time.perf_counter()
+        self.first_byte_at = None
+        self.rows = 0
+        self.bytes = 0
+        self.peak_memory = _current_rss_bytes()
+        self.fetch_batches = []
+        self.encode_batches = []
+        self.finished = False
+        self.store.export_started(endpoint)
+
+    def chunk_sent(self, chunk):
+        if self.first_byte_at is None:
+            self.first_byte_at = time.perf_counter()
+        self.bytes += len(chunk)
+
+    def count_rows(self, rows):
+        self.rows += rows
+
+    def observe_batch(self, fetch_seconds, encode_seconds):
+        self.fetch_batches.append(fetch_seconds)
+        self.encode_batches.append(encode_seconds)
+        self.peak_memory = max(self.peak_memory, _current_rss_bytes())
+
+    def encode_rows(self, rows, encode):
+        clock = time.perf_counter
+        fetch_seconds = encode_seconds = 0.0
+        batch_rows = 0
+        while True:
+            started = clock()
+            try:
+                row = next(rows)
+            except StopIteration:
+                break
+            fetched = clock()
+            line = encode(row)
+            fetch_seconds += fetched - started
+            encode_seconds += clock() - fetched
+            self.rows += 1
+            batch_rows += 1
+            if batch_rows == BATCH_SIZE:
+                self.observe_batch(fetch_seconds, encode_seconds)
+                fetch_seconds = encode_seconds = 0.0
+                batch_rows = 0
+            yield line
+        if batch_rows:
+            self.observe_batch(fetch_seconds, encode_seconds)
+
+    def finish(self, outcome):
+        if self.finished:
+            return
+        self.finished = True
+
+        duration = max(time.perf_counter() - self.started_at, 1e-9)
+        self.peak_memory = max(self.peak_memory, _current_rss_bytes())
+        observations = {
+            'sales_export_duration_seconds': [duration],
+            'sales_export_rows_per_second': [self.rows / duration],
+            'sales_export_bytes_per_second': [self.bytes / duration],
+            'sales_export_batch_fetch_seconds': self.fetch_batches,
+            'sales_export_batch_encode_seconds': self.encode_batches,
+            'sales_export_peak_memory_bytes': [self.peak_memory],
+        }
+        if self.first_byte_at is not None:
+            observations['sales_export_time_to_first_byte_seconds'] = [self.first_byte_at - self.started_at]
+
+        labels = {'endpoint': self.endpoint}
+        counters = [
+            ('sales_exports_total', {**labels, 'outcome': outcome}, 1),
+            ('sales_export_rows_total', labels, self.rows),
+            ('sales_export_bytes_total', labels, self.bytes),
+        ]
+        self.store.export_finished(self.endpoint, counters, observations)
+
+
+def _format_labels(labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels)
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(data):
+    lines = []
+
+    counters = {}
+    for key, value in data.get('counters', {}).items():
+        name, labels = json.loads(key)
+        counters.setdefault(name, []).append((labels, value))
+    for name, help_text in COUNTERS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for labels, value in sorted(counters.get(name, [])):
+            lines.append(f'{name}{{{_format_labels(labels)}}} {_format_number(value)}')
+
+    lines.append(f'# HELP {ACTIVE_GAUGE} Exports currently streaming.')
+    lines.append(f'# TYPE {ACTIVE_GAUGE} gauge')
+    for endpoint, per_process in sorted(data.get('active', {}).items()):
+        active = sum(count for pid, count in per_process.items() if _pid_alive(int(pid)))
+        lines.append(f'{ACTIVE_GAUGE}{{endpoint="{endpoint}"}} {active}')
+
+    histograms = {}
+    for key, histogram in data.get('histograms', {}).items():
+        name, labels = json.loads(key)
+        histograms.setdefault(name, []).append((labels, histogram))
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for labels, histogram in sorted(histograms.get(name, []), key=lambda item: item[0]):
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), histogram['buckets']):
+                cumulative += count
+                bucket_labels = _format_labels([*labels, ('le', bound if bound == '+Inf' else repr(float(bound)))])
+                lines.append(f'{name}_bucket{{{bucket_labels}}} {cumulative}')
+            lines.append(f'{name}_sum{{{_format_labels(labels)}}} {_format_number(histogram["sum"])}')
+            lines.append(f'{name}_count{{{_format_labels(labels)}}} {histogram["count"]}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS['ALLOWED_IPS']:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_prometheus(get_metrics_store().read()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,52 @@
+# Generated by Django 6.0.2 on 2026-10-18 23:38
+
+from django.db import migrations, models
+from django.db.models import BigIntegerField, F, Max
+from django.db.models.functions import Cast, Round
+
+BACKFILL_BATCH_SIZE = 50000
+
+
+def _cents(field_name):
+    return Cast(Round(F(field_name) * 100), BigIntegerField())
+
+
+def backfill_cents(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    Product = apps.get_model('sales', 'Product')
+    SaleItem = apps.get_model('sales', 'SaleItem')
+
+    Product.objects.using(alias).update(base_price_cents=_cents('base_price'))
+
+    max_id = SaleItem.objects.using(alias).aggregate(max_id=Max('id'))['max_id'] or 0
+    for start in range(0, max_id + 1, BACKFILL_BATCH_SIZE):
+        SaleItem.objects.using(alias).filter(id__gte=start, id__lt=start + BACKFILL_BATCH_SIZE).update(
+            unit_price_cents=_cents('unit_price'),
+            line_total_cents=_cents('line_total'),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='base_price_cents',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='saleitem',
+            name='line_total_cents',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='saleitem',
+            name='unit_price_cents',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_cents, migrations.RunPython.noop, elidable=True),
+    ]
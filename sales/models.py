@@ -2,7 +2,33 @@ from decimal import Decimal
 
 from django.conf import settings
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import IntegrityError, models, transaction
+
+from .money import to_cents
+from .sharding import allocate_sale_ids, shard_for_reseller, shard_for_sale, sharding_enabled
+
+SALE_ID_ATTEMPTS = 5
+
+
+def _save_shard(instance, shard, kwargs):
+    # Rows stay on the shard they were loaded from; `default` or no alias means "route it".
+    using = kwargs.get('using') or instance._state.db
+    if using in settings.SALES_SHARDS and using != shard:
+        raise ValueError(
+            f'{instance} belongs on {shard}, not {using}. '
+            'Moving sales between shards is not supported; delete and recreate the sale instead.'
+        )
+    kwargs['using'] = shard
+    return shard
+
+
+def _with_cents_fields(kwargs, cents_fields):
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None:
+        update_fields = set(update_fields)
+        kwargs['update_fields'] = update_fields | {
+            cents for field, cents in cents_fields.items() if field in update_fields
+        }
 
 
 class Reseller(models.Model):
@@ -35,6 +61,7 @@ class Product(models.Model):
     name = models.CharField(max_length=140)
     description = models.TextField(blank=True)
     base_price = models.DecimalField(max_digits=12, decimal_places=2)
+    base_price_cents = models.BigIntegerField(null=True, editable=False)
     stock_quantity = models.PositiveIntegerField(default=0)
     categories = models.ManyToManyField(Category, related_name='products')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -45,6 +72,11 @@ class Product(models.Model):
             models.Index(fields=['name']),
         ]
 
+    def save(self, *args, **kwargs):
+        self.base_price_cents = to_cents(self.base_price)
+        _with_cents_fields(kwargs, {'base_price': 'base_price_cents'})
+        super().save(*args, **kwargs)
+
     def __str__(self) -> str:
         return f'{self.sku} - {self.name}'
 
@@ -57,6 +89,24 @@ class Sale(models.Model):
     class Meta:
         indexes = [models.Index(fields=['reseller', 'sold_at'])]
 
+    def save(self, *args, **kwargs):
+        if not sharding_enabled():
+            return super().save(*args, **kwargs)
+
+        alias = _save_shard(self, shard_for_reseller(self.reseller_id), kwargs)
+        if self.pk is not None:
+            return super().save(*args, **kwargs)
+
+        for attempt in range(SALE_ID_ATTEMPTS):
+            self.pk = allocate_sale_ids(alias, 1)[0]
+            try:
+                with transaction.atomic(using=alias):
+                    return super().save(*args, **{**kwargs, 'force_insert': True})
+            except IntegrityError:
+                self.pk = None
+                if attempt == SALE_ID_ATTEMPTS - 1:
+                    raise
+
     def __str__(self) -> str:
         return f'Sale #{self.pk}'
 
@@ -68,6 +118,8 @@ class SaleItem(models.Model):
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
     unit_price = models.DecimalField(max_digits=12, decimal_places=2)
     line_total = models.DecimalField(max_digits=14, decimal_places=2)
+    unit_price_cents = models.BigIntegerField(null=True, editable=False)
+    line_total_cents = models.BigIntegerField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -81,6 +133,11 @@ class SaleItem(models.Model):
     def save(self, *args, **kwargs):
         if self.line_total in (None, Decimal('0')):
             self.line_total = self.unit_price * self.quantity
+        self.unit_price_cents = to_cents(self.unit_price)
+        self.line_total_cents = to_cents(self.line_total)
+        _with_cents_fields(kwargs, {'unit_price': 'unit_price_cents', 'line_total': 'line_total_cents'})
+        if sharding_enabled():
+            _save_shard(self, shard_for_sale(self.sale_id), kwargs)
         super().save(*args, **kwargs)
 
     def __str__(self) -> str:
@@ -0,0 +1,17 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+
+def to_cents(value):
+    if value is None:
+        return None
+    return int(Decimal(value).scaleb(2).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+def format_cents(cents):
+    if cents < 0:
+        return '-%d.%02d' % divmod(-cents, 100)
+    return '%d.%02d' % divmod(cents, 100)
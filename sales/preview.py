@@ -0,0 +1,56 @@
+from django.db import DatabaseError, connections
+from django.db.models import Max, Min
+
+from .models import SaleItem
+
+
+def _table_statistics_rows(alias, table):
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES '
+                'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                [table],
+            )
+        elif connection.vendor == 'sqlite':
+            try:
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+            except DatabaseError:
+                return None
+        else:
+            return None
+        row = cursor.fetchone()
+
+    if row is None or row[0] is None:
+        return None
+    return int(str(row[0]).split()[0]) or None
+
+
+def _primary_key_range_rows(alias):
+    bounds = SaleItem.objects.using(alias).aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return 0
+    return bounds['high'] - bounds['low'] + 1
+
+
+def estimate_sale_item_rows(aliases):
+    table = SaleItem._meta.db_table
+    total = 0
+    source = 'table-statistics'
+    for alias in aliases:
+        rows = _table_statistics_rows(alias, table)
+        if rows is None:
+            rows = _primary_key_range_rows(alias)
+            source = 'primary-key-range'
+        total += rows
+    return total, source
+
+
+def estimate_report_size(header_bytes, preview_rows, preview_bytes, limit, aliases):
+    if preview_rows < limit:
+        return preview_rows, header_bytes + preview_bytes, 'exact'
+
+    rows, source = estimate_sale_item_rows(aliases)
+    rows = max(rows, preview_rows)
+    return rows, header_bytes + round(preview_bytes / preview_rows * rows), source
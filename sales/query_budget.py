@@ -0,0 +1,181 @@
+import logging
+import math
+import time
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+view_budgets = {}
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryBudget:
+    def __init__(
+        self,
+        max_queries,
+        max_db_seconds=None,
+        per_chunk_queries=0,
+        per_chunk_db_seconds=0,
+        chunk_size=5000,
+        name=None,
+    ):
+        self.max_queries = max_queries
+        self.max_db_seconds = max_db_seconds
+        self.per_chunk_queries = per_chunk_queries
+        self.per_chunk_db_seconds = per_chunk_db_seconds
+        self.chunk_size = chunk_size
+        self.name = name
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+
+    def _execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+
+    @property
+    def chunks(self):
+        return math.ceil(self.rows / self.chunk_size)
+
+    @property
+    def allowed_queries(self):
+        return self.max_queries + self.per_chunk_queries * self.chunks
+
+    @property
+    def allowed_db_seconds(self):
+        if self.max_db_seconds is None:
+            return None
+        return self.max_db_seconds + self.per_chunk_db_seconds * self.chunks
+
+    def count_rows(self, rows):
+        self.rows += rows
+
+    def reset(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+
+    @contextmanager
+    def active(self):
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(self._execute))
+            yield self
+
+    def violations(self):
+        problems = []
+        if self.queries > self.allowed_queries:
+            problems.append(f'{self.queries} queries (allowed {self.allowed_queries})')
+        allowed_db_seconds = self.allowed_db_seconds
+        if allowed_db_seconds is not None and self.db_seconds > allowed_db_seconds:
+            problems.append(f'{self.db_seconds:.3f}s in the database (allowed {allowed_db_seconds:.3f}s)')
+        return problems
+
+    def check(self, strict=None):
+        problems = self.violations()
+        if not problems:
+            return
+        message = f'Query budget exceeded for {self.name or "block"}: {", ".join(problems)} over {self.rows} rows.'
+        if settings.QUERY_BUDGET_STRICT if strict is None else strict:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+    def copy(self, name=None):
+        return QueryBudget(
+            self.max_queries,
+            max_db_seconds=self.max_db_seconds,
+            per_chunk_queries=self.per_chunk_queries,
+            per_chunk_db_seconds=self.per_chunk_db_seconds,
+            chunk_size=self.chunk_size,
+            name=name or self.name,
+        )
+
+    def __call__(self, view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            budget = self.copy(name=self.name or view.__name__)
+            with budget.active():
+                response = view(request, *args, **kwargs)
+
+            tracker = getattr(request, 'export_tracker', None)
+            rows = None if tracker is None else (lambda: tracker.rows)
+            if not response.streaming:
+                budget.count_rows(response.content.count(b'\n') if rows is None else rows())
+                budget.check()
+                return response
+
+            response.streaming_content = _BudgetedStream(response.streaming_content, budget, rows)
+            return response
+
+        view_budgets[f'{view.__module__}.{view.__qualname__}'] = self
+        return wrapper
+
+    def __enter__(self):
+        self.reset()
+        self._active = self.active()
+        self._active.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._active.__exit__(exc_type, exc_value, traceback)
+        if exc_type is None:
+            self.check()
+
+
+class _BudgetedStream:
+    def __init__(self, content, budget, rows=None):
+        self._content = iter(content)
+        self._budget = budget
+        self._rows = rows
+        self._active = None
+        self._checked = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._active is None:
+            self._active = self._budget.active()
+            self._active.__enter__()
+        try:
+            chunk = next(self._content)
+        except StopIteration:
+            self._finish()
+            raise
+        except BaseException:
+            self._release()
+            raise
+        if self._rows is None:
+            self._budget.count_rows(chunk.count(b'\n'))
+        return chunk
+
+    def _release(self):
+        if self._active is not None:
+            active, self._active = self._active, None
+            active.__exit__(None, None, None)
+        if self._rows is not None:
+            self._budget.rows = self._rows()
+
+    def _finish(self, strict=None):
+        self._release()
+        if not self._checked:
+            self._checked = True
+            self._budget.check(strict=strict)
+
+    def close(self):
+        self._finish(strict=False)
+
+
+def query_budget(max_queries, **options):
+    return QueryBudget(max_queries, **options)
@@ -0,0 +1,265 @@
+import csv
+import hashlib
+import os
+import shutil
+import tempfile
+import zlib
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import BigIntegerField, Count, F, Func, Max, Sum
+from django.db.models.functions import Cast, Floor
+
+from .sharding import iterate_sale_rows
+
+SEGMENT_FORMAT_VERSION = 3
+READ_CHUNK_SIZE = 1024 * 1024
+FLUSH_ROW_COUNT = 1000
+POSITION_WEIGHT_MODULUS = 1009
+
+
+class _EpochSeconds(Func):
+    template = 'FLOOR(EXTRACT(EPOCH FROM %(expressions)s))'
+    output_field = BigIntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="CAST(strftime('%%%%s', %(expressions)s) AS INTEGER)")
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='FLOOR(UNIX_TIMESTAMP(%(expressions)s))')
+
+
+class _Microsecond(Func):
+    template = 'CAST(EXTRACT(MICROSECONDS FROM %(expressions)s) AS BIGINT) %%%% 1000000'
+    output_field = BigIntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='CAST(substr(%(expressions)s, 21, 6) AS INTEGER)')
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='MICROSECOND(%(expressions)s)')
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+class SegmentCache:
+    def __init__(self, directory, block_size, max_bytes):
+        self.directory = Path(directory)
+        self.block_size = block_size
+        self.max_bytes = max_bytes
+
+    def _block_prefix(self, block):
+        return f'block-{block:010d}-'
+
+    def segment_path(self, block, fingerprint, compressed=False):
+        suffix = '.csv.gz' if compressed else '.csv'
+        return self.directory / f'{self._block_prefix(block)}{fingerprint}{suffix}'
+
+    def open_segment(self, block, fingerprint, compressed=False):
+        path = self.segment_path(block, fingerprint, compressed)
+        try:
+            handle = open(path, 'rb', buffering=0)
+        except FileNotFoundError:
+            return None
+        os.utime(handle.fileno())
+        return handle
+
+    def store(self, block, fingerprint, raw_path, compressed_path):
+        self.invalidate_block(block)
+        os.replace(raw_path, self.segment_path(block, fingerprint))
+        os.replace(compressed_path, self.segment_path(block, fingerprint, compressed=True))
+        self.evict()
+
+    def invalidate_block(self, block):
+        if not self.directory.is_dir():
+            return
+        for path in self.directory.glob(f'{self._block_prefix(block)}*'):
+            path.unlink(missing_ok=True)
+
+    def invalidate_sale(self, sale_id):
+        self.invalidate_block(sale_id // self.block_size)
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def evict(self):
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as iterator:
+            for entry in iterator:
+                if not entry.name.startswith('block-'):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            Path(path).unlink(missing_ok=True)
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+@lru_cache(maxsize=1)
+def get_segment_cache():
+    config = settings.REPORT_SEGMENT_CACHE
+    return SegmentCache(
+        directory=config['DIR'],
+        block_size=config['BLOCK_SIZE'],
+        max_bytes=config['MAX_BYTES'],
+    )
+
+
+def _position_weighted_sum(field, position='id'):
+    # The +1 keeps rows whose position is a multiple of the modulus from weighing zero.
+    return Sum(F(field) * (F(position) % POSITION_WEIGHT_MODULUS + 1))
+
+
+def block_fingerprints(item_queryset, block_size, aliases):
+    rows = (
+        item_queryset.order_by()
+        .annotate(block=Cast(Floor(F('sale_id') / block_size), BigIntegerField()))
+        .values('block')
+        .annotate(
+            item_count=Count('id'),
+            max_item_id=Max('id'),
+            quantity_sum=_position_weighted_sum('quantity'),
+            unit_price_sum=_position_weighted_sum('unit_price'),
+            total_sum=_position_weighted_sum('line_total'),
+            product_sum=_position_weighted_sum('product_id'),
+            category_sum=_position_weighted_sum('category_id'),
+            reseller_sum=_position_weighted_sum('sale__reseller_id', position='sale_id'),
+            sold_at_seconds_sum=Sum(_EpochSeconds('sale__sold_at')),
+            sold_at_microseconds_sum=Sum(_Microsecond('sale__sold_at')),
+        )
+        .order_by('block')
+    )
+    columns = [
+        'item_count',
+        'max_item_id',
+        'quantity_sum',
+        'unit_price_sum',
+        'total_sum',
+        'product_sum',
+        'category_sum',
+        'reseller_sum',
+        'sold_at_seconds_sum',
+        'sold_at_microseconds_sum',
+    ]
+
+    payloads = {}
+    item_counts = {}
+    for alias in aliases:
+        for row in rows.using(alias):
+            item_counts[row['block']] = item_counts.get(row['block'], 0) + row['item_count']
+            payloads.setdefault(row['block'], []).append(
+                ':'.join([str(SEGMENT_FORMAT_VERSION), *(str(row[column]) for column in columns)])
+            )
+
+    return {
+        block: (
+            hashlib.blake2b('|'.join(payloads[block]).encode(), digest_size=8).hexdigest(),
+            item_counts[block],
+        )
+        for block in sorted(payloads)
+    }
+
+
+def _iter_file(handle):
+    with handle:
+        while chunk := handle.read(READ_CHUNK_SIZE):
+            yield chunk
+
+
+def _render_rows(queryset, serialize_row, tracker, aliases):
+    writer = csv.writer(_Echo())
+
+    def encode(row):
+        return writer.writerow(serialize_row(row))
+
+    lines = []
+    rows = iterate_sale_rows(queryset, aliases)
+    try:
+        for line in tracker.encode_rows(rows, encode):
+            lines.append(line)
+            if len(lines) >= FLUSH_ROW_COUNT:
+                yield ''.join(lines).encode('utf-8')
+                lines = []
+    finally:
+        rows.close()
+    if lines:
+        yield ''.join(lines).encode('utf-8')
+
+
+def _gzip_member(chunks):
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _render_and_store(cache, block, fingerprint, chunks, compressed):
+    cache.directory.mkdir(parents=True, exist_ok=True)
+    raw_fd, raw_path = tempfile.mkstemp(dir=cache.directory, suffix='.tmp')
+    gz_fd, gz_path = tempfile.mkstemp(dir=cache.directory, suffix='.tmp')
+    compressor = zlib.compressobj(wbits=31)
+    stored = False
+    try:
+        with os.fdopen(raw_fd, 'wb') as raw_file, os.fdopen(gz_fd, 'wb') as gz_file:
+            for chunk in chunks:
+                raw_file.write(chunk)
+                compressed_chunk = compressor.compress(chunk)
+                gz_file.write(compressed_chunk)
+                if compressed:
+                    if compressed_chunk:
+                        yield compressed_chunk
+                else:
+                    yield chunk
+            tail = compressor.flush()
+            gz_file.write(tail)
+        cache.store(block, fingerprint, raw_path, gz_path)
+        stored = True
+        if compressed:
+            yield tail
+    finally:
+        if not stored:
+            Path(raw_path).unlink(missing_ok=True)
+            Path(gz_path).unlink(missing_ok=True)
+
+
+def stream_cached_report(cache, queryset, item_queryset, header, serialize_row, tracker, aliases, compressed=False):
+    block_size = cache.block_size
+    fingerprints = block_fingerprints(item_queryset, block_size, aliases)
+    live_block = max(fingerprints, default=None)
+
+    header_line = csv.writer(_Echo()).writerow(header).encode('utf-8')
+    yield from _gzip_member([header_line]) if compressed else [header_line]
+
+    for block, (fingerprint, item_count) in fingerprints.items():
+        block_queryset = queryset.filter(
+            sale_id__gte=block * block_size,
+            sale_id__lt=(block + 1) * block_size,
+        )
+        chunks = _render_rows(block_queryset, serialize_row, tracker, aliases)
+
+        if block == live_block:
+            yield from _gzip_member(chunks) if compressed else chunks
+            continue
+
+        segment = cache.open_segment(block, fingerprint, compressed)
+        if segment is not None:
+            tracker.count_rows(item_count)
+            yield from _iter_file(segment)
+            continue
+
+        yield from _render_and_store(cache, block, fingerprint, chunks, compressed)
@@ -0,0 +1,50 @@
+from django.conf import settings
+from rest_framework import serializers
+
+
+class ReportFilterSerializer(serializers.Serializer):
+    sold_from = serializers.DateTimeField(required=False)
+    sold_to = serializers.DateTimeField(required=False)
+    reseller = serializers.IntegerField(required=False, min_value=1)
+    region = serializers.CharField(required=False, max_length=60)
+    category = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, attrs):
+        sold_from = attrs.get('sold_from')
+        sold_to = attrs.get('sold_to')
+        if sold_from and sold_to and sold_from >= sold_to:
+            raise serializers.ValidationError('sold_from must be earlier than sold_to.')
+        return attrs
+
+
+class ReportPreviewSerializer(serializers.Serializer):
+    preview = serializers.IntegerField(min_value=1, max_value=settings.REPORT_PREVIEW_MAX_ROWS)
+
+
+class AnalyticsFilterSerializer(ReportFilterSerializer):
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=100, default=10)
+
+
+class TopProductSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    sku = serializers.CharField()
+    name = serializers.CharField()
+    quantity = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=18, decimal_places=2)
+
+
+class TopResellerSerializer(serializers.Serializer):
+    region = serializers.CharField()
+    rank = serializers.IntegerField()
+    reseller_id = serializers.IntegerField()
+    company_name = serializers.CharField()
+    sale_count = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=18, decimal_places=2)
+
+
+class CategoryMixSerializer(serializers.Serializer):
+    month = serializers.DateField()
+    category_id = serializers.IntegerField()
+    category = serializers.CharField()
+    quantity = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=18, decimal_places=2)
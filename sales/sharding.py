@@ -0,0 +1,150 @@
+import heapq
+import queue
+import threading
+from itertools import islice
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Max
+
+SHARDED_MODELS = {'sales.sale', 'sales.saleitem'}
+FETCH_CHUNK_SIZE = 5000
+QUEUE_DEPTH = 4
+PUT_TIMEOUT = 0.1
+
+_DONE = object()
+
+
+def sharding_enabled():
+    return bool(settings.SALES_SHARDS)
+
+
+def shard_for_reseller(reseller_id):
+    shards = settings.SALES_SHARDS
+    return shards[reseller_id % len(shards)]
+
+
+def shard_for_sale(sale_id):
+    shards = settings.SALES_SHARDS
+    return shards[sale_id % len(shards)]
+
+
+def sale_aliases(reseller=None):
+    if not sharding_enabled():
+        return [DEFAULT_DB_ALIAS]
+    if reseller is not None:
+        return [shard_for_reseller(reseller)]
+    return list(settings.SALES_SHARDS)
+
+
+def allocate_sale_ids(alias, count):
+    from .models import Sale
+
+    shards = settings.SALES_SHARDS
+    step = len(shards)
+    index = shards.index(alias)
+    current = Sale.objects.using(alias).aggregate(max_id=Max('id'))['max_id'] or 0
+    first = current - current % step + index
+    if first <= current:
+        first += step
+    return range(first, first + count * step, step)
+
+
+class SalesShardRouter:
+    def _shard_for(self, model, instance):
+        label = model._meta.label_lower
+        if not sharding_enabled() or label not in SHARDED_MODELS or instance is None:
+            return None
+        hint = instance._meta.label_lower
+        if hint in SHARDED_MODELS and instance._state.db in settings.SALES_SHARDS:
+            return instance._state.db
+        if hint == 'sales.reseller' and label == 'sales.sale' and instance.pk is not None:
+            return shard_for_reseller(instance.pk)
+        if hint == 'sales.sale':
+            if instance.reseller_id is not None:
+                return shard_for_reseller(instance.reseller_id)
+            if instance.pk is not None:
+                return shard_for_sale(instance.pk)
+        if hint == 'sales.saleitem' and instance.sale_id is not None:
+            return shard_for_sale(instance.sale_id)
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._shard_for(model, hints.get('instance'))
+
+    def db_for_write(self, model, **hints):
+        return self._shard_for(model, hints.get('instance'))
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if sharding_enabled():
+            return True
+        return None
+
+
+def _put(out, item, stop):
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=PUT_TIMEOUT)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _produce(queryset, alias, out, stop):
+    try:
+        batch = []
+        for row in queryset.using(alias).iterator(chunk_size=FETCH_CHUNK_SIZE):
+            batch.append(row)
+            if len(batch) >= FETCH_CHUNK_SIZE:
+                if not _put(out, batch, stop):
+                    return
+                batch = []
+        if batch and not _put(out, batch, stop):
+            return
+        _put(out, _DONE, stop)
+    except Exception as error:
+        _put(out, error, stop)
+    finally:
+        connections[alias].close()
+
+
+def _consume(out):
+    while True:
+        item = out.get()
+        if item is _DONE:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield from item
+
+
+def _scatter_gather(queryset, aliases):
+    stop = threading.Event()
+    streams = []
+    for alias in aliases:
+        out = queue.Queue(maxsize=QUEUE_DEPTH)
+        threading.Thread(
+            target=_produce,
+            args=(queryset, alias, out, stop),
+            name=f'scatter-gather-{alias}',
+            daemon=True,
+        ).start()
+        streams.append(_consume(out))
+
+    try:
+        yield from heapq.merge(*streams, key=itemgetter(0))
+    finally:
+        stop.set()
+
+
+def iterate_sale_rows(queryset, aliases):
+    if len(aliases) == 1:
+        return queryset.using(aliases[0]).iterator(chunk_size=FETCH_CHUNK_SIZE)
+    return _scatter_gather(queryset, aliases)
+
+
+def first_sale_rows(queryset, aliases, limit):
+    streams = [queryset.using(alias)[:limit] for alias in aliases]
+    return list(islice(heapq.merge(*streams, key=itemgetter(0)), limit))
@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Category, Product, Reseller, Sale, SaleItem
+from .report_cache import get_segment_cache
+from .sharding import sharding_enabled
+
+# Shards only need the user columns the reports join on.
+REPLICATED_USER_FIELDS = {'username'}
+
+
+def _changes_report_columns(created, update_fields, columns):
+    if created:
+        return False
+    return update_fields is None or bool(columns & set(update_fields))
+
+
+@receiver(post_save, sender=SaleItem)
+def invalidate_sale_item_segment(sender, instance, **kwargs):
+    get_segment_cache().invalidate_sale(instance.sale_id)
+
+
+@receiver(post_save, sender=Sale)
+def invalidate_sale_segment(sender, instance, **kwargs):
+    get_segment_cache().invalidate_sale(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def invalidate_segments_on_product_change(sender, instance, created, update_fields, **kwargs):
+    if _changes_report_columns(created, update_fields, {'sku', 'name'}):
+        get_segment_cache().clear()
+
+
+@receiver(post_save, sender=Category)
+def invalidate_segments_on_category_change(sender, instance, created, update_fields, **kwargs):
+    if _changes_report_columns(created, update_fields, {'name'}):
+        get_segment_cache().clear()
+
+
+@receiver(post_save, sender=Reseller)
+def invalidate_segments_on_reseller_change(sender, instance, created, update_fields, **kwargs):
+    if _changes_report_columns(created, update_fields, {'user', 'user_id'}):
+        get_segment_cache().clear()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_segments_on_user_change(sender, instance, created, update_fields, **kwargs):
+    if _changes_report_columns(created, update_fields, {'username'}):
+        get_segment_cache().clear()
+
+
+def _replicated_fields(sender, created, update_fields):
+    fields = [field for field in sender._meta.concrete_fields if not field.primary_key]
+    if created:
+        return fields
+    if sender._meta.label_lower == settings.AUTH_USER_MODEL.lower():
+        fields = [field for field in fields if field.name in REPLICATED_USER_FIELDS]
+    if update_fields is not None:
+        fields = [field for field in fields if field.name in update_fields or field.attname in update_fields]
+    return fields
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Reseller)
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def replicate_reference_row_to_shards(sender, instance, created, update_fields, using, **kwargs):
+    if using != DEFAULT_DB_ALIAS or not sharding_enabled():
+        return
+    fields = _replicated_fields(sender, created, update_fields)
+    if not fields:
+        return
+    values = {field.attname: getattr(instance, field.attname) for field in fields}
+    for alias in settings.SALES_SHARDS:
+        manager = sender._base_manager.using(alias)
+        if created or not manager.filter(pk=instance.pk).update(**values):
+            row = {field.attname: getattr(instance, field.attname) for field in sender._meta.concrete_fields}
+            manager.bulk_create([sender(**row)], ignore_conflicts=True)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Reseller)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def delete_reference_row_from_shards(sender, instance, using, **kwargs):
+    if using != DEFAULT_DB_ALIAS or not sharding_enabled():
+        return
+    for alias in settings.SALES_SHARDS:
+        sender._base_manager.using(alias).filter(pk=instance.pk).delete()
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def replicate_product_categories_to_shards(sender, instance, action, reverse, using, **kwargs):
+    if using != DEFAULT_DB_ALIAS or not sharding_enabled():
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    scope = {'category_id' if reverse else 'product_id': instance.pk}
+    links = list(sender.objects.using(DEFAULT_DB_ALIAS).filter(**scope))
+    for alias in settings.SALES_SHARDS:
+        with transaction.atomic(using=alias):
+            sender.objects.using(alias).filter(**scope).delete()
+            sender.objects.using(alias).bulk_create(links)
@@ -0,0 +1,76 @@
+import math
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from django.urls import resolve, reverse
+
+from sales.query_budget import QueryBudget, view_budgets
+from sales.report_cache import get_segment_cache
+
+BUDGETED_REPORTS = [
+    ('optimized', 'report-optimized-csv'),
+    ('optimized-categories', 'report-optimized-categories-csv'),
+    ('cached', 'report-cached-csv'),
+]
+SALE_COUNTS = (200, 2000)
+
+
+class ReportQueryBudgetTests(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        scratch = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(
+            override_settings(
+                QUERY_BUDGET_STRICT=True,
+                REPORT_SEGMENT_CACHE={**settings.REPORT_SEGMENT_CACHE, 'DIR': scratch / 'report_cache'},
+                METRICS={**settings.METRICS, 'STORE_PATH': scratch / 'metrics.json'},
+            )
+        )
+        get_segment_cache.cache_clear()
+        self.addCleanup(get_segment_cache.cache_clear)
+
+    def _seed(self, sale_count):
+        call_command(
+            'seed_sales',
+            reset=True,
+            user_count=20,
+            category_count=10,
+            product_count=200,
+            sale_count=sale_count,
+            chunk_size=500,
+            seed=42,
+            stdout=StringIO(),
+        )
+
+    def _measure(self, url_name):
+        counter = QueryBudget(max_queries=0)
+        with counter.active():
+            response = self.client.get(reverse(url_name))
+            content = b''.join(response.streaming_content)
+            response.close()
+        self.assertEqual(response.status_code, 200)
+        return counter.queries, content.count(b'\n') - 1
+
+    def test_reports_stay_within_query_budgets(self):
+        results = {label: [] for label, _ in BUDGETED_REPORTS}
+        for sale_count in SALE_COUNTS:
+            self._seed(sale_count)
+            for label, url_name in BUDGETED_REPORTS:
+                results[label].append(self._measure(url_name))
+
+        for label, url_name in BUDGETED_REPORTS:
+            with self.subTest(report=label):
+                view_class = resolve(reverse(url_name)).func.cls
+                budget = view_budgets[f'{view_class.__module__}.{view_class.__name__}']
+                (small_queries, small_rows), (large_queries, large_rows) = results[label]
+                self.assertLess(small_rows, large_rows)
+
+                allowed_growth = budget.per_chunk_queries * (
+                    math.ceil(large_rows / budget.chunk_size) - math.ceil(small_rows / budget.chunk_size)
+                )
+                self.assertLessEqual(large_queries - small_queries, allowed_growth)
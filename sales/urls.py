@@ -1,8 +1,25 @@
 from django.urls import path
 
-from .views import optimized_sales_report_stream_csv, unoptimized_sales_report_csv
+from .views import (
+    cached_sales_report_stream_csv,
+    category_mix_analytics,
+    optimized_sales_report_stream_csv,
+    optimized_sales_report_with_categories_csv,
+    top_products_analytics,
+    top_resellers_analytics,
+    unoptimized_sales_report_csv,
+)
 
 urlpatterns = [
     path('reports/unoptimized', unoptimized_sales_report_csv, name='report-unoptimized-csv'),
     path('reports/optimized', optimized_sales_report_stream_csv, name='report-optimized-csv'),
+    path(
+        'reports/optimized-categories',
+        optimized_sales_report_with_categories_csv,
+        name='report-optimized-categories-csv',
+    ),
+    path('reports/cached', cached_sales_report_stream_csv, name='report-cached-csv'),
+    path('analytics/top-products', top_products_analytics, name='analytics-top-products'),
+    path('analytics/top-resellers', top_resellers_analytics, name='analytics-top-resellers'),
+    path('analytics/category-mix', category_mix_analytics, name='analytics-category-mix'),
 ]
@@ -1,13 +1,43 @@
 import csv
+import hashlib
+import heapq
+import re
 from datetime import datetime
 from decimal import Decimal
+from functools import wraps
+from operator import attrgetter
 
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import BigIntegerField, F, OuterRef, StringAgg, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Round
 from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
 from django.utils.timezone import is_aware
 from rest_framework.decorators import api_view, renderer_classes
-from rest_framework.renderers import BaseRenderer
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.response import Response
 
-from .models import Sale, SaleItem
+from . import analytics
+from .export_control import export_admission
+from .filters import apply_report_filters
+from .models import Product, Sale, SaleItem
+from .money import format_cents
+from .preview import estimate_report_size
+from .query_budget import query_budget
+from .report_cache import get_segment_cache, stream_cached_report
+from .sharding import first_sale_rows, iterate_sale_rows, sale_aliases
+from .serializers import (
+    AnalyticsFilterSerializer,
+    CategoryMixSerializer,
+    ReportFilterSerializer,
+    ReportPreviewSerializer,
+    TopProductSerializer,
+    TopResellerSerializer,
+)
+
+_accepts_gzip_re = re.compile(r'\bgzip\b')
 
 
 class CSVRenderer(BaseRenderer):
@@ -23,7 +53,28 @@ class CSVRenderer(BaseRenderer):
             return data
         if isinstance(data, str):
             return data.encode(self.charset)
-        return str(data).encode(self.charset)
+        # Error payloads (validation, throttling, export budgets) are rendered as JSON.
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = JSONRenderer.media_type
+        return JSONRenderer().render(data, renderer_context=renderer_context)
+
+
+CATEGORY_DELIMITER = '|'
+
+REPORT_HEADER = [
+    'sale_id',
+    'sale_date',
+    'reseller_username',
+    'product_sku',
+    'product_name',
+    'item_category',
+    'quantity',
+    'unit_price',
+    'line_total',
+]
+
+REPORT_WITH_CATEGORIES_HEADER = [*REPORT_HEADER, 'product_categories']
 
 
 def _serialize_csv_value(value):
@@ -36,28 +87,37 @@ def _serialize_csv_value(value):
     return value
 
 
+def _serialize_report_row(row):
+    return [_serialize_csv_value(value) for value in row]
+
+
+def _serialize_cents_report_row(row):
+    return [
+        *map(_serialize_csv_value, row[:7]),
+        format_cents(row[7]),
+        format_cents(row[8]),
+        *map(_serialize_csv_value, row[9:]),
+    ]
+
+
+def _report_row_serializer():
+    return _serialize_cents_report_row if settings.SALES_MONEY_CENTS else _serialize_report_row
+
+
 @api_view(['GET'])
 @renderer_classes([CSVRenderer])
+@export_admission
 def unoptimized_sales_report_csv(request):
     response = HttpResponse(content_type='text/csv; charset=utf-8')
     response['Content-Disposition'] = 'attachment; filename="unoptimized_sales_report.csv"'
 
     writer = csv.writer(response)
-    writer.writerow(
-        [
-            'sale_id',
-            'sale_date',
-            'reseller_username',
-            'product_sku',
-            'product_name',
-            'item_category',
-            'quantity',
-            'unit_price',
-            'line_total',
-        ]
-    )
+    writer.writerow(REPORT_HEADER)
 
-    sales = Sale.objects.all().order_by('id')
+    sales = heapq.merge(
+        *(Sale.objects.using(alias).order_by('id') for alias in sale_aliases()),
+        key=attrgetter('id'),
+    )
     for sale in sales:
         reseller_username = sale.reseller.user.username
 
@@ -74,6 +134,7 @@ def unoptimized_sales_report_csv(request):
                 item.line_total,
             ]
             writer.writerow([_serialize_csv_value(value) for value in row])
+            request.export_budget.count_rows(1)
 
     return response
 
@@ -83,21 +144,35 @@ class Echo:
         return value
 
 
-@api_view(['GET'])
-@renderer_classes([CSVRenderer])
-def optimized_sales_report_stream_csv(request):
-    pseudo_buffer = Echo()
-    writer = csv.writer(pseudo_buffer)
+def _report_filters(request):
+    serializer = ReportFilterSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
 
-    queryset = (
-        SaleItem.objects.select_related(
+
+def _cents_or_decimal(field):
+    return Coalesce(f'{field}_cents', Cast(Round(F(field) * 100), BigIntegerField()))
+
+
+def _report_queryset(filters=None, **annotations):
+    queryset = apply_report_filters(SaleItem.objects.all(), filters or {})
+    money_fields = ('unit_price', 'line_total')
+    if settings.SALES_MONEY_CENTS:
+        # Rows written without the cents twins (update(), raw SQL) fall back to the Decimal column.
+        queryset = queryset.annotate(
+            unit_price_in_cents=_cents_or_decimal('unit_price'),
+            line_total_in_cents=_cents_or_decimal('line_total'),
+        )
+        money_fields = ('unit_price_in_cents', 'line_total_in_cents')
+    return (
+        queryset.select_related(
             'sale',
             'sale__reseller',
             'sale__reseller__user',
             'product',
             'category',
         )
-        .prefetch_related('product__categories')
+        .annotate(**annotations)
         .values_list(
             'sale_id',
             'sale__sold_at',
@@ -106,29 +181,208 @@ def optimized_sales_report_stream_csv(request):
             'product__name',
             'category__name',
             'quantity',
-            'unit_price',
-            'line_total',
+            *money_fields,
+            *annotations,
         )
         .order_by('sale_id', 'id')
     )
 
-    header = [
-        'sale_id',
-        'sale_date',
-        'reseller_username',
-        'product_sku',
-        'product_name',
-        'item_category',
-        'quantity',
-        'unit_price',
-        'line_total',
-    ]
+
+def _product_categories_subquery():
+    ordering = {}
+    if connection.features.supports_aggregate_order_by_clause:
+        ordering['order_by'] = 'category__name'
+    return Subquery(
+        Product.categories.through.objects.filter(product_id=OuterRef('product_id'))
+        .values('product_id')
+        .annotate(names=StringAgg('category__name', delimiter=Value(CATEGORY_DELIMITER), **ordering))
+        .values('names')
+    )
+
+
+def _stream_report_response(queryset, filename, tracker, aliases, header=REPORT_HEADER):
+    pseudo_buffer = Echo()
+    writer = csv.writer(pseudo_buffer)
+    serialize_row = _report_row_serializer()
+
+    def encode(row):
+        return writer.writerow(serialize_row(row))
 
     def row_generator():
         yield writer.writerow(header)
-        for row in queryset.iterator(chunk_size=5000):
-            yield writer.writerow([_serialize_csv_value(value) for value in row])
+        rows = iterate_sale_rows(queryset, aliases)
+        try:
+            yield from tracker.encode_rows(rows, encode)
+        finally:
+            rows.close()
 
     response = StreamingHttpResponse(row_generator(), content_type='text/csv; charset=utf-8')
-    response['Content-Disposition'] = 'attachment; filename="optimized_sales_report.csv"'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _product_categories_annotation():
+    return {'product_categories': _product_categories_subquery()}
+
+
+def _preview_response(request, name, header, annotations):
+    serializer = ReportPreviewSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    limit = serializer.validated_data['preview']
+    filters = _report_filters(request)
+    aliases = sale_aliases(filters.get('reseller'))
+
+    writer = csv.writer(Echo())
+    with query_budget(max_queries=3 * len(aliases), name=f'{name} preview'):
+        rows = first_sale_rows(_report_queryset(filters, **annotations()), aliases, limit)
+        header_line = writer.writerow(header)
+        serialize_row = _report_row_serializer()
+        body = ''.join(writer.writerow(serialize_row(row)) for row in rows)
+        total_rows, total_bytes, source = estimate_report_size(
+            len(header_line.encode()), len(rows), len(body.encode()), limit, aliases
+        )
+
+    response = HttpResponse(header_line + body, content_type='text/csv; charset=utf-8')
+    response['X-Preview-Rows'] = len(rows)
+    response['X-Estimated-Total-Rows'] = total_rows
+    response['X-Estimated-Total-Bytes'] = total_bytes
+    response['X-Estimate-Source'] = source
+    if filters and source != 'exact':
+        response['X-Estimate-Scope'] = 'unfiltered'
     return response
+
+
+def report_preview(header=REPORT_HEADER, annotations=dict):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if 'preview' not in request.query_params:
+                return view(request, *args, **kwargs)
+            return _preview_response(request, view.__name__, header, annotations)
+
+        return wrapper
+
+    return decorator
+
+
+@api_view(['GET'])
+@renderer_classes([CSVRenderer])
+@report_preview()
+@export_admission
+@query_budget(max_queries=2)
+def optimized_sales_report_stream_csv(request):
+    filters = _report_filters(request)
+    return _stream_report_response(
+        _report_queryset(filters),
+        'optimized_sales_report.csv',
+        request.export_tracker,
+        sale_aliases(filters.get('reseller')),
+    )
+
+
+@api_view(['GET'])
+@renderer_classes([CSVRenderer])
+@report_preview(header=REPORT_WITH_CATEGORIES_HEADER, annotations=_product_categories_annotation)
+@export_admission
+@query_budget(max_queries=2)
+def optimized_sales_report_with_categories_csv(request):
+    filters = _report_filters(request)
+    queryset = _report_queryset(filters, **_product_categories_annotation())
+    return _stream_report_response(
+        queryset,
+        'optimized_sales_report_with_categories.csv',
+        request.export_tracker,
+        sale_aliases(filters.get('reseller')),
+        header=REPORT_WITH_CATEGORIES_HEADER,
+    )
+
+
+@api_view(['GET'])
+@renderer_classes([CSVRenderer])
+@report_preview()
+@export_admission
+@query_budget(
+    max_queries=2 + len(sale_aliases()),
+    per_chunk_queries=1,
+    chunk_size=settings.REPORT_SEGMENT_CACHE['BLOCK_SIZE'],
+)
+def cached_sales_report_stream_csv(request):
+    filters = _report_filters(request)
+    if filters:
+        return _stream_report_response(
+            _report_queryset(filters),
+            'cached_sales_report.csv',
+            request.export_tracker,
+            sale_aliases(filters.get('reseller')),
+        )
+
+    compressed = bool(_accepts_gzip_re.search(request.headers.get('Accept-Encoding', '')))
+
+    content = stream_cached_report(
+        get_segment_cache(),
+        _report_queryset(),
+        SaleItem.objects.all(),
+        REPORT_HEADER,
+        _report_row_serializer(),
+        request.export_tracker,
+        sale_aliases(),
+        compressed=compressed,
+    )
+
+    response = StreamingHttpResponse(content, content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="cached_sales_report.csv"'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if compressed:
+        response['Content-Encoding'] = 'gzip'
+    return response
+
+
+def _cached_analytics(name, filters, compute):
+    params = '&'.join(f'{key}={value}' for key, value in sorted(filters.items()))
+    key = f'sales-analytics:{name}:{hashlib.blake2b(params.encode(), digest_size=16).hexdigest()}'
+    data = cache.get(key)
+    if data is None:
+        data = compute()
+        cache.set(key, data, settings.ANALYTICS_CACHE_TTL)
+    return data
+
+
+def _analytics_filters(request):
+    serializer = AnalyticsFilterSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    filters = dict(serializer.validated_data)
+    limit = filters.pop('limit')
+    return filters, limit
+
+
+@api_view(['GET'])
+def top_products_analytics(request):
+    filters, limit = _analytics_filters(request)
+    data = _cached_analytics(
+        'top-products',
+        {**filters, 'limit': limit},
+        lambda: TopProductSerializer(analytics.top_products(filters, limit), many=True).data,
+    )
+    return Response(data)
+
+
+@api_view(['GET'])
+def top_resellers_analytics(request):
+    filters, limit = _analytics_filters(request)
+    data = _cached_analytics(
+        'top-resellers',
+        {**filters, 'limit': limit},
+        lambda: TopResellerSerializer(analytics.top_resellers_by_region(filters, limit), many=True).data,
+    )
+    return Response(data)
+
+
+@api_view(['GET'])
+def category_mix_analytics(request):
+    filters = _report_filters(request)
+    data = _cached_analytics(
+        'category-mix',
+        filters,
+        lambda: CategoryMixSerializer(analytics.category_mix_by_month(filters), many=True).data,
+    )
+    return Response(data)